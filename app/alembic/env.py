@@ -15,6 +15,7 @@ if config.config_file_name is not None:
 
 # add your model's MetaData object here
 # for 'autogenerate' support
+from app.db import sql_echo_enabled
 from app.models import Base
 target_metadata = Base.metadata
 
@@ -36,7 +37,7 @@ def run_migrations() -> None:
     sql_alchemy_url = context.config.attributes.get(
         "sqlalchemy_url", default_sql_alchemy_url
     )
-    connectable = create_engine(sql_alchemy_url, echo=True)
+    connectable = create_engine(sql_alchemy_url, echo=sql_echo_enabled())
     with connectable.connect() as connection:
         context.configure(
             connection=connection, target_metadata=target_metadata
@@ -1,99 +1,276 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
-from sqlmodel import select, Session
-from pydantic import BaseModel
-from typing import Optional, Tuple
+import hashlib
+from typing import Annotated, Any, NamedTuple, cast
 
+import msgspec
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response
+from pydantic import Field, TypeAdapter, ValidationError
+from redis.asyncio import Redis
+from sqlalchemy import exists, insert
+from sqlalchemy.orm import raiseload
+from sqlmodel import col, select
+from sqlmodel.sql.expression import Select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.db import get_db
-from app.models import Location, Organisation, CreateOrganisation
+
+from app.cache import ORGANISATION_LIST_KEY, get_cache, get_cached, invalidate, organisation_key, set_cached
+from app.db import get_async_db
+from app.models import BulkCreateLocations, CreateLocation, Location, Organisation, CreateOrganisation
 
 router = APIRouter()
 
+
+# Responses are encoded with msgspec, Pydantic is only used to validate requests
+class OrganisationResponse(msgspec.Struct):
+    id: int
+    name: str
+
+
+class LocationResponse(msgspec.Struct):
+    location_name: str
+    location_longitude: float
+    location_latitude: float
+
+
+_encoder = msgspec.json.Encoder()
+
+
+def _list_response_docs(struct: type[msgspec.Struct]) -> dict[int | str, dict[str, Any]]:
+    """
+    OpenAPI documentation for a response that is a JSON array of a flat msgspec struct.
+    """
+    _, components = msgspec.json.schema_components([struct])
+    schema = {"type": "array", "items": components[struct.__name__]}
+    return {200: {"content": {"application/json": {"schema": schema}}}}
+
+
+def _json_response(content: bytes) -> Response:
+    return Response(content=content, media_type="application/json")
+
+
+def _etag_json_response(request: Request, content: bytes) -> Response:
+    """
+    JSON response with an ETag, answers 304 Not Modified when the client already has this content.
+    The ETag is a hash of the body, so callers have to return rows in a deterministic order.
+    It is weak because GZipMiddleware may send the same content with a different encoding.
+    """
+    opaque_tag = f'"{hashlib.blake2b(content, digest_size=16).hexdigest()}"'
+    etag = f"W/{opaque_tag}"
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored on both sides
+    client_etags = {
+        client_etag.strip().removeprefix("W/")
+        for client_etag in request.headers.get("if-none-match", "").split(",")
+    }
+    if opaque_tag in client_etags or "*" in client_etags:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return Response(content=content, media_type="application/json", headers={"ETag": etag})
+
+
+def _supports_insert_returning(session: AsyncSession) -> bool:
+    return session.bind is not None and session.bind.dialect.insert_returning
+
+
 @router.post("/create", response_model=Organisation)
-def create_organisation(create_organisation: CreateOrganisation, session: Session = Depends(get_db)) -> Organisation:
+async def create_organisation(
+    create_organisation: CreateOrganisation,
+    session: AsyncSession = Depends(get_async_db),
+    cache: Redis | None = Depends(get_cache),
+) -> Organisation:
     """Create an organisation."""
-    organisation = Organisation(name=create_organisation.name)
-    session.add(organisation)
-    session.commit()
-    session.refresh(organisation)
+    if _supports_insert_returning(session):
+        # INSERT ... RETURNING saves the SELECT that refresh() would issue
+        query = insert(Organisation).values(name=create_organisation.name).returning(
+            col(Organisation.id), col(Organisation.name)
+        )
+        row = (await session.execute(query)).one()
+        await session.commit()
+        organisation = Organisation(id=row.id, name=row.name)
+    else:
+        organisation = Organisation(name=create_organisation.name)
+        session.add(organisation)
+        await session.commit()
+        await session.refresh(organisation)
+    await invalidate(cache, ORGANISATION_LIST_KEY)
     return organisation
 
 
-@router.get("/", response_model=list[Organisation])
-def get_organisations(session: Session = Depends(get_db)) -> list[Organisation]:
+@router.get("/", response_model=None, responses=_list_response_docs(OrganisationResponse))
+async def get_organisations(
+    request: Request,
+    session: AsyncSession = Depends(get_async_db),
+    cache: Redis | None = Depends(get_cache),
+) -> Response:
     """
     Get all organisations.
     """
-    organisations = session.exec(select(Organisation)).all()
-    return organisations
+    content = await get_cached(cache, ORGANISATION_LIST_KEY)
+    if content is None:
+        query = select(col(Organisation.id), col(Organisation.name)).order_by(col(Organisation.id))
+        # The id column is the primary key, so selected ids are never None
+        organisations = [
+            OrganisationResponse(cast(int, organisation_id), name)
+            for organisation_id, name in await session.exec(query)
+        ]
+        content = _encoder.encode(organisations)
+        await set_cached(cache, ORGANISATION_LIST_KEY, content)
+    return _etag_json_response(request, content)
 
 
 
-@router.get("/{organisation_id}", response_model=Organisation)
-def get_organisation(organisation_id: int, session: Session = Depends(get_db)) -> Organisation:
+@router.get("/{organisation_id}", response_model=None, responses={200: {"model": Organisation}})
+async def get_organisation(
+    organisation_id: int,
+    session: AsyncSession = Depends(get_async_db),
+    cache: Redis | None = Depends(get_cache),
+) -> Response:
     """
     Get an organisation by id.
     """
-    organisation = session.get(Organisation, organisation_id)
-    if organisation is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Organisation not found")
-    return organisation
+    content = await get_cached(cache, organisation_key(organisation_id))
+    if content is None:
+        organisation = await session.get(Organisation, organisation_id, options=[raiseload("*")])
+        if organisation is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Organisation not found")
+        content = _encoder.encode(OrganisationResponse(organisation_id, organisation.name))
+        await set_cached(cache, organisation_key(organisation_id), content)
+    return _json_response(content)
 
 
 @router.post("/create/locations")
-def create_location():
-    raise NotImplementedError
+async def create_location(
+    create_location: CreateLocation, session: AsyncSession = Depends(get_async_db)
+) -> dict:
+    """
+    Create a location for an existing organisation.
+    """
+    organisation_exists = select(exists().where(col(Organisation.id) == create_location.organisation_id))
+    if not await session.scalar(organisation_exists):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="organisation not found")
 
-class LocationResponse(BaseModel):
-    location_name: str
-    location_longitude: float
-    location_latitude: float
+    location = Location(**create_location.model_dump())
+    session.add(location)
+    # flush assigns the primary key, the row is read before commit expires it
+    await session.flush()
+    location_data = location.model_dump()
+    await session.commit()
+    return {"message": "Location created", "location": location_data}
 
-@router.get("/{organisation_id}/locations")
-def get_organisation_locations(
-    organisation_id: int,
-    bounding_box: Optional[Tuple[float, float, float, float]] = Query(None),
-    session: Session = Depends(get_db)
-):
+
+_MAX_REPORTED_MISSING_IDS = 10
+
+
+@router.post("/create/locations/bulk")
+async def create_locations_bulk(
+    bulk_create_locations: BulkCreateLocations, session: AsyncSession = Depends(get_async_db)
+) -> dict:
     """
-    get all locations for a given organisation id, optionally filtered by a bounding box.
+    Create many locations with a single multi-row INSERT.
     """
-    organisation = session.get(Organisation, organisation_id)
-    if organisation is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="organisation not found")
+    if not bulk_create_locations.items:
+        return {"message": "Locations created", "location_ids": []}
+
+    # SQLite does not enforce the foreign key, so check every organisation in one query
+    organisation_ids = {item.organisation_id for item in bulk_create_locations.items}
+    existing_organisation_ids = set(
+        await session.exec(select(Organisation.id).where(col(Organisation.id).in_(organisation_ids)))
+    )
+    missing_organisation_ids = sorted(organisation_ids - existing_organisation_ids)
+    if missing_organisation_ids:
+        shown_ids = missing_organisation_ids[:_MAX_REPORTED_MISSING_IDS]
+        more = len(missing_organisation_ids) - len(shown_ids)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"organisations not found: {shown_ids}" + (f" and {more} more" if more else ""),
+        )
 
-    query = select(Location).where(Location.organisation_id == organisation_id)
+    # sort_by_parameter_order keeps location_ids aligned with the submitted items
+    result = await session.execute(
+        insert(Location).returning(col(Location.id), sort_by_parameter_order=True),
+        [item.model_dump() for item in bulk_create_locations.items],
+    )
+    location_ids = list(result.scalars())
+    await session.commit()
+    return {"message": "Locations created", "location_ids": location_ids}
 
-    if bounding_box:
-        min_longitude, min_latitude, max_longitude, max_latitude = bounding_box
-        query = query.where(
-            Location.longitude >= min_longitude,
-            Location.longitude <= max_longitude,
-            Location.latitude >= min_latitude,
-            Location.latitude <= max_latitude,
+FiniteFloat = Annotated[float, Field(allow_inf_nan=False)]
+
+
+class BoundingBox(NamedTuple):
+    min_longitude: FiniteFloat
+    min_latitude: FiniteFloat
+    max_longitude: FiniteFloat
+    max_latitude: FiniteFloat
+
+
+_BOUNDING_BOX_ADAPTER = TypeAdapter(BoundingBox)
+
+
+async def parse_bounding_box(
+    bounding_box: str | None = Query(
+        None, description="min_longitude,min_latitude,max_longitude,max_latitude"
+    ),
+) -> BoundingBox | None:
+    """
+    Parses the optional "min_longitude,min_latitude,max_longitude,max_latitude" query parameter.
+    """
+    if bounding_box is None:
+        return None
+    try:
+        bounds = _BOUNDING_BOX_ADAPTER.validate_python(bounding_box.split(","))
+    except ValidationError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="bounding_box must be four comma separated finite numbers",
+        ) from None
+    if bounds.min_longitude > bounds.max_longitude or bounds.min_latitude > bounds.max_latitude:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="bounding_box minimum coordinates must not exceed the maximum coordinates",
         )
+    return bounds
 
-    locations = session.exec(query).all()
-    
-    if not locations:
-        return []
 
-    return [
-        LocationResponse(
-            location_name=location.location_name,
-            location_longitude=location.longitude,
-            location_latitude=location.latitude,
+def organisation_locations_query(
+    organisation_id: int, bounding_box: BoundingBox | None
+) -> Select[str, float, float]:
+    """
+    Query for the locations of an organisation, optionally limited to a bounding box.
+    """
+    # Insertion order, independent of which index the planner picks for the filter
+    query = (
+        select(Location.location_name, Location.longitude, Location.latitude)
+        .where(Location.organisation_id == organisation_id)
+        .order_by(col(Location.id))
+    )
+    if bounding_box is not None:
+        query = query.where(
+            col(Location.longitude).between(bounding_box.min_longitude, bounding_box.max_longitude),
+            col(Location.latitude).between(bounding_box.min_latitude, bounding_box.max_latitude),
         )
-        for location in locations
-    ]
+    return query
+
 
-@router.get("/create/location")
-async def create_location_get(session: Session = Depends(get_db)):
+@router.get("/{organisation_id}/locations", response_model=None, responses=_list_response_docs(LocationResponse))
+async def get_organisation_locations(
+    request: Request,
+    organisation_id: int,
+    bounding_box: BoundingBox | None = Depends(parse_bounding_box),
+    session: AsyncSession = Depends(get_async_db)
+) -> Response:
     """
-    endpoint from the first task to create locations
+    get all locations for a given organisation id, optionally filtered by a bounding box.
     """
-    new_location = Location(location_name="Default Name", longitude=0.0, latitude=0.0, organisation_id=1)
-    session.add(new_location)
-    session.commit()
-    session.refresh(new_location)
-    return {"message": "Location created", "location": new_location}
+    query = organisation_locations_query(organisation_id, bounding_box)
+
+    # Build the response in a single pass instead of materialising the rows first
+    locations = [
+        LocationResponse(row.location_name, row.longitude, row.latitude)
+        async for row in await session.stream(query.execution_options(yield_per=1000))
+    ]
+
+    # Only pay for the existence check when there is nothing to return
+    if not locations:
+        organisation_exists = select(exists().where(col(Organisation.id) == organisation_id))
+        if not await session.scalar(organisation_exists):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="organisation not found")
+
+    return _etag_json_response(request, _encoder.encode(locations))
@@ -0,0 +1,66 @@
+"""
+Best effort Redis cache for organisation reads, Redis errors are logged and treated
+as a cache miss or a skipped write so the database stays the source of truth.
+"""
+import logging
+import os
+from functools import cache
+from typing import cast
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# Kept short on purpose: a list read that misses can still write the pre-insert list
+# right after create_organisation invalidated it, and the TTL bounds how long that lasts.
+# Deleting again after commit would not close the race, the stale write can land later.
+CACHE_TTL_SECONDS = 30
+ORGANISATION_LIST_KEY = "org:list"
+
+
+def organisation_key(organisation_id: int) -> str:
+    return f"org:{organisation_id}"
+
+
+@cache
+def _get_redis(url: str) -> Redis:
+    return Redis.from_url(url)
+
+
+async def get_cache() -> Redis | None:
+    """
+    Retrieves the shared Redis client
+    :return: Redis client, None when REDIS_URL is not configured and caching is disabled
+    """
+    url = os.environ.get("REDIS_URL")
+    return _get_redis(url) if url else None
+
+
+async def get_cached(redis: Redis | None, key: str) -> bytes | None:
+    if redis is None:
+        return None
+    try:
+        # The client is created without decode_responses, so values come back as bytes
+        return cast(bytes | None, await redis.get(key))
+    except RedisError:
+        logger.exception("Failed to read %s from cache", key)
+        return None
+
+
+async def set_cached(redis: Redis | None, key: str, value: bytes) -> None:
+    if redis is None:
+        return
+    try:
+        await redis.setex(key, CACHE_TTL_SECONDS, value)
+    except RedisError:
+        logger.exception("Failed to write %s to cache", key)
+
+
+async def invalidate(redis: Redis | None, *keys: str) -> None:
+    if redis is None:
+        return
+    try:
+        await redis.delete(*keys)
+    except RedisError:
+        logger.exception("Failed to invalidate %s in cache", ", ".join(keys))
@@ -1,21 +1,59 @@
+import os
 from contextlib import contextmanager
-from typing import Generator
+from functools import cache
+from typing import Any, AsyncGenerator, Generator
 
 import sqlmodel
 from sqlalchemy import create_engine, Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 
+_DATABASE_URL = "sqlite:///backend.db"
+_ASYNC_DATABASE_URL = "sqlite+aiosqlite:///backend.db"
+
+
+def sql_echo_enabled() -> bool:
+    """
+    Whether SQL statement logging is switched on through the SQL_ECHO environment variable
+    """
+    return os.environ.get("SQL_ECHO", "").lower() in {"1", "true", "yes"}
+
+
+def _engine_options() -> dict[str, Any]:
+    """
+    Connection pool settings shared by the sync and async engines.
+    DB_POOL_SIZE and DB_MAX_OVERFLOW override the pool limits, SQL_ECHO enables SQL logging.
+    """
+    return {
+        "echo": sql_echo_enabled(),
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", "20")),
+        "pool_timeout": 30,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+    }
+
+
+@cache
 def get_engine() -> Engine:
-    return create_engine("sqlite:///backend.db", echo=True)
+    return create_engine(
+        _DATABASE_URL, connect_args={"check_same_thread": False}, **_engine_options()
+    )
 
 
-def get_db() -> Generator[Session, None, None]:
+@cache
+def get_async_engine() -> AsyncEngine:
+    return create_async_engine(_ASYNC_DATABASE_URL, **_engine_options())
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
     """
-    Retrieves new SQLAlchemy Session from connection pool
-    :yield: SQLAlchemy Session
+    Retrieves new async SQLAlchemy Session from connection pool
+    :yield: SQLAlchemy AsyncSession
     """
-    with sqlmodel.Session(get_engine()) as session:
+    async with AsyncSession(get_async_engine()) as session:
         yield session
 
 
@@ -1,10 +1,14 @@
 
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 
 from app.api.route import api_router
 
 
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
+
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 app.include_router(api_router, prefix="/api")
\ No newline at end of file
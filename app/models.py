@@ -1,3 +1,4 @@
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field, Relationship
 
 
@@ -8,15 +9,40 @@ class CreateOrganisation(Base):
     name: str
 
 
+class CreateLocation(Base):
+    organisation_id: int
+    location_name: str
+    longitude: float
+    latitude: float
+
+
+MAX_BULK_LOCATIONS = 1000
+
+
+class BulkCreateLocations(Base):
+    items: list[CreateLocation] = Field(max_length=MAX_BULK_LOCATIONS)
+
+
 class Organisation(Base, table=True):
-    id: int | None = Field(primary_key=True)
+    id: int | None = Field(default=None, primary_key=True)
     name: str
+    # Relationships never lazy load, queries have to opt in with an eager loading option
+    locations: list["Location"] = Relationship(
+        back_populates="organisation", sa_relationship_kwargs={"lazy": "raise"}
+    )
 
 
 class Location(Base, table=True):
-    id: int | None = Field(primary_key=True)
+    # organisation_id is the leading column, so this also serves plain lookups by organisation
+    __table_args__ = (
+        Index("ix_location_organisation_id_longitude_latitude", "organisation_id", "longitude", "latitude"),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
     organisation_id: int = Field(foreign_key="organisation.id")
-    organisation: Organisation = Relationship()
+    organisation: Organisation = Relationship(
+        back_populates="locations", sa_relationship_kwargs={"lazy": "raise"}
+    )
     location_name: str
     longitude: float
     latitude: float
@@ -1,3 +1,4 @@
+import asyncio
 from pathlib import Path
 from typing import Generator
 from unittest.mock import patch
@@ -7,11 +8,16 @@ import alembic.command
 import alembic.config
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-
-from app.db import get_database_session
+from redis.exceptions import ConnectionError as RedisConnectionError
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.cache import ORGANISATION_LIST_KEY, get_cache, organisation_key
+from app.db import get_database_session, sql_echo_enabled
+from app.api.routes.organisations import BoundingBox, organisation_locations_query
 from app.main import app
-from app.models import Organisation
+from app.models import MAX_BULK_LOCATIONS, Base, Location, Organisation
 
 _ALEMBIC_INI_PATH = Path(__file__).parent.parent / "alembic.ini"
 
@@ -19,22 +25,94 @@ _ALEMBIC_INI_PATH = Path(__file__).parent.parent / "alembic.ini"
 def test_client() -> TestClient:
     return TestClient(app)
 
-@pytest.fixture(autouse=True)
-def apply_alembic_migrations() -> Generator[None, None, None]:
-    # Creates test database per test function
+class FakeRedis:
+    """In-memory stand-in for the subset of redis.asyncio.Redis used by app.cache"""
+
+    def __init__(self) -> None:
+        self.store: dict[str, bytes] = {}
+
+    async def get(self, key: str) -> bytes | None:
+        return self.store.get(key)
+
+    async def setex(self, key: str, ttl: int, value: bytes) -> None:
+        self.store[key] = value
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self.store.pop(key, None)
+
+
+class UnavailableRedis:
+    """Stand-in for a Redis server that cannot be reached"""
+
+    async def get(self, key: str) -> bytes | None:
+        raise RedisConnectionError("Connection refused")
+
+    async def setex(self, key: str, ttl: int, value: bytes) -> None:
+        raise RedisConnectionError("Connection refused")
+
+    async def delete(self, *keys: str) -> None:
+        raise RedisConnectionError("Connection refused")
+
+
+@pytest.fixture()
+def unavailable_cache() -> Generator[None, None, None]:
+    app.dependency_overrides[get_cache] = UnavailableRedis
+    yield
+    app.dependency_overrides.pop(get_cache)
+
+
+@pytest.fixture()
+def fake_cache() -> Generator[FakeRedis, None, None]:
+    cache = FakeRedis()
+    app.dependency_overrides[get_cache] = lambda: cache
+    yield cache
+    app.dependency_overrides.pop(get_cache)
+
+def _set_test_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    # Test databases are throwaway, so trade durability for fewer fsyncs
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+@pytest.fixture(scope="session", autouse=True)
+def apply_alembic_migrations() -> Generator[Engine, None, None]:
+    # Creates and migrates a single test database shared by the whole test session
     test_db_file_name = f"test_{uuid4()}.db"
     database_path = Path(test_db_file_name)
+    echo = sql_echo_enabled()
     try:
         test_db_url = f"sqlite:///{test_db_file_name}"
+        test_engine = create_engine(test_db_url, echo=echo)
+        test_async_engine = create_async_engine(f"sqlite+aiosqlite:///{test_db_file_name}", echo=echo)
+        event.listen(test_engine, "connect", _set_test_sqlite_pragmas)
+        event.listen(test_async_engine.sync_engine, "connect", _set_test_sqlite_pragmas)
+        # WAL journal mode is persisted in the database file, so the migrations below benefit too
+        with test_engine.begin() as connection:
+            connection.exec_driver_sql("PRAGMA journal_mode=WAL")
+
         alembic_cfg = alembic.config.Config(_ALEMBIC_INI_PATH)
         alembic_cfg.attributes["sqlalchemy_url"] = test_db_url
         alembic.command.upgrade(alembic_cfg, "head")
-        test_engine = create_engine(test_db_url, echo=True)
-        with patch("app.db.get_engine") as mock_engine:
+        with patch("app.db.get_engine") as mock_engine, patch("app.db.get_async_engine") as mock_async_engine:
             mock_engine.return_value = test_engine
-            yield
+            mock_async_engine.return_value = test_async_engine
+            yield test_engine
+        test_engine.dispose()
+        asyncio.run(test_async_engine.dispose())
     finally:
-        database_path.unlink(missing_ok=True)
+        for path in (database_path, Path(f"{test_db_file_name}-wal"), Path(f"{test_db_file_name}-shm")):
+            path.unlink(missing_ok=True)
+
+@pytest.fixture(autouse=True)
+def clean_database(apply_alembic_migrations: Engine) -> Generator[None, None, None]:
+    # The app commits through its own sessions on two engines, so tests are isolated
+    # by emptying the tables afterwards rather than by rolling back a shared transaction
+    yield
+    with apply_alembic_migrations.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            connection.execute(table.delete())
 
 
 def test_organisation_endpoints(test_client: TestClient) -> None:
@@ -60,6 +138,16 @@ def test_organisation_endpoints(test_client: TestClient) -> None:
     assert  set(organisations) == created_organisation_names
 
 
+def test_create_organisation_without_insert_returning(test_client: TestClient) -> None:
+    with patch("app.api.routes.organisations._supports_insert_returning", return_value=False):
+        response = test_client.post("/api/organisations/create", json={"name": "No Returning Org"})
+    assert response.status_code == status.HTTP_200_OK
+    organisation_id = response.json()["id"]
+
+    response = test_client.get(f"/api/organisations/{organisation_id}")
+    assert response.json() == {"id": organisation_id, "name": "No Returning Org"}
+
+
 def test_get_organisations(test_client: TestClient) -> None:
     response = test_client.get("/api/organisations/")
     assert response.status_code == status.HTTP_200_OK
@@ -117,7 +205,7 @@ def test_get_organisation_locations_empty(test_client: TestClient) -> None:
     assert response.json() == []
 
 
-def test_create_location_not_implemented(test_client: TestClient) -> None:
+def test_create_location_organisation_not_found(test_client: TestClient) -> None:
     location_data = {
         "location_name": "Test Location",
         "longitude": 10.0,
@@ -125,7 +213,7 @@ def test_create_location_not_implemented(test_client: TestClient) -> None:
         "organisation_id": 0
     }
     response = test_client.post("/api/organisations/create/locations", json=location_data)
-    assert response.status_code == status.HTTP_501_NOT_IMPLEMENTED
+    assert response.status_code == status.HTTP_404_NOT_FOUND
 
 
 def test_get_organisation_locations_with_bounding_box(test_client: TestClient) -> None:
@@ -156,11 +244,167 @@ def test_get_organisation_locations_empty_bounding_box(test_client: TestClient)
     assert response.json() == []
 
 
-def test_create_location_via_get(test_client: TestClient) -> None:
+def test_get_organisation_locations_invalid_bounding_box(test_client: TestClient) -> None:
+    response = test_client.post("/api/organisations/create", json={"name": "Invalid Bounding Box Org"})
+    organisation_id = response.json()["id"]
+
+    response = test_client.get(f"/api/organisations/{organisation_id}/locations?bounding_box=1.0,2.0,3.0")
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    for bounding_box in ("a,b,c,d", "nan,0,10,10", "inf,-inf,inf,inf", "10,10,0,0", "0,10,10,0"):
+        response = test_client.get(f"/api/organisations/{organisation_id}/locations?bounding_box={bounding_box}")
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_get_organisation_locations_not_found(test_client: TestClient) -> None:
+    response = test_client.get("/api/organisations/99999/locations")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_get_organisations_is_cached_until_organisation_created(test_client: TestClient, fake_cache: FakeRedis) -> None:
+    test_client.post("/api/organisations/create", json={"name": "Cached Org"})
+
+    response = test_client.get("/api/organisations/")
+    assert response.status_code == status.HTTP_200_OK
+    assert ORGANISATION_LIST_KEY in fake_cache.store
+
+    test_client.post("/api/organisations/create", json={"name": "Another Org"})
+    assert ORGANISATION_LIST_KEY not in fake_cache.store
+
+    response = test_client.get("/api/organisations/")
+    assert set(organisation["name"] for organisation in response.json()) == {"Cached Org", "Another Org"}
+
+
+def test_get_organisation_is_cached(test_client: TestClient, fake_cache: FakeRedis) -> None:
+    response = test_client.post("/api/organisations/create", json={"name": "Cached Org"})
+    organisation_id = response.json()["id"]
+
+    test_client.get(f"/api/organisations/{organisation_id}")
+    assert organisation_key(organisation_id) in fake_cache.store
+
+    fake_cache.store[organisation_key(organisation_id)] = b'{"id": %d, "name": "From Cache"}' % organisation_id
+    response = test_client.get(f"/api/organisations/{organisation_id}")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["name"] == "From Cache"
+
+
+def test_create_locations_bulk(test_client: TestClient) -> None:
+    response = test_client.post("/api/organisations/create", json={"name": "Bulk Locations Org"})
+    organisation_id = response.json()["id"]
+    items = [
+        {"location_name": f"Location {index}", "longitude": float(coordinate), "latitude": float(coordinate), "organisation_id": organisation_id}
+        for index, coordinate in enumerate([2, 0, 1])
+    ]
+
+    response = test_client.post("/api/organisations/create/locations/bulk", json={"items": items})
+    assert response.status_code == status.HTTP_200_OK
+    location_ids = response.json()["location_ids"]
+    assert len(location_ids) == len(items)
+
+    with get_database_session() as database_session:
+        created_names = [database_session.get(Location, location_id).location_name for location_id in location_ids]
+    assert created_names == [item["location_name"] for item in items]
+
+    response = test_client.get(f"/api/organisations/{organisation_id}/locations")
+    assert [location["location_name"] for location in response.json()] == ["Location 0", "Location 1", "Location 2"]
+
+    response = test_client.get(f"/api/organisations/{organisation_id}/locations?bounding_box=0.5,0.5,2.0,2.0")
+    assert [location["location_name"] for location in response.json()] == ["Location 0", "Location 2"]
+
+
+def test_organisation_endpoints_fall_back_when_cache_unavailable(test_client: TestClient, unavailable_cache: None) -> None:
+    response = test_client.post("/api/organisations/create", json={"name": "Uncached Org"})
+    assert response.status_code == status.HTTP_200_OK
+    organisation_id = response.json()["id"]
+
+    response = test_client.get("/api/organisations/")
+    assert response.status_code == status.HTTP_200_OK
+    assert [organisation["name"] for organisation in response.json()] == ["Uncached Org"]
+
+    response = test_client.get(f"/api/organisations/{organisation_id}")
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_organisation_locations_are_not_lazy_loaded(test_client: TestClient) -> None:
+    response = test_client.post("/api/organisations/create", json={"name": "Lazy Org"})
+    organisation_id = response.json()["id"]
+
+    with get_database_session() as database_session:
+        organisation = database_session.get(Organisation, organisation_id)
+        with pytest.raises(InvalidRequestError):
+            _ = organisation.locations
+
+
+@pytest.mark.parametrize("bounding_box", [None, BoundingBox(0.0, 0.0, 10.0, 10.0)])
+def test_locations_by_organisation_use_index(apply_alembic_migrations: Engine, bounding_box: BoundingBox | None) -> None:
+    query = organisation_locations_query(1, bounding_box)
+    compiled_query = query.compile(apply_alembic_migrations, compile_kwargs={"literal_binds": True})
+    with apply_alembic_migrations.connect() as connection:
+        query_plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled_query}").all()
+    assert any("USING INDEX ix_location_organisation_id_longitude_latitude" in step[-1] for step in query_plan)
+
+
+def test_get_organisations_not_modified(test_client: TestClient) -> None:
+    test_client.post("/api/organisations/create", json={"name": "ETag Org"})
+
+    response = test_client.get("/api/organisations/")
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+
+    response = test_client.get("/api/organisations/", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.content == b""
+
+    response = test_client.get("/api/organisations/", headers={"If-None-Match": etag.removeprefix("W/")})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    test_client.post("/api/organisations/create", json={"name": "Another ETag Org"})
+    response = test_client.get("/api/organisations/", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] != etag
+
+
+def test_create_locations_bulk_organisation_not_found(test_client: TestClient) -> None:
+    response = test_client.post("/api/organisations/create", json={"name": "Bulk Locations Org"})
+    organisation_id = response.json()["id"]
+    items = [
+        {"location_name": "Location A", "longitude": 1.0, "latitude": 1.0, "organisation_id": organisation_id},
+        {"location_name": "Location B", "longitude": 2.0, "latitude": 2.0, "organisation_id": 424242},
+    ]
+
+    response = test_client.post("/api/organisations/create/locations/bulk", json={"items": items})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    response = test_client.get(f"/api/organisations/{organisation_id}/locations")
+    assert response.json() == []
+    response = test_client.get("/api/organisations/424242/locations")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_create_locations_bulk_limits(test_client: TestClient) -> None:
+    location = {"location_name": "Location", "longitude": 0.0, "latitude": 0.0, "organisation_id": 0}
+
+    response = test_client.post(
+        "/api/organisations/create/locations/bulk", json={"items": [location] * (MAX_BULK_LOCATIONS + 1)}
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    items = [{**location, "organisation_id": organisation_id} for organisation_id in range(1000, 1050)]
+    response = test_client.post("/api/organisations/create/locations/bulk", json={"items": items})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json()["detail"].endswith("and 40 more")
+
+
+def test_get_organisation_locations_gzipped(test_client: TestClient) -> None:
+    response = test_client.post("/api/organisations/create", json={"name": "Gzip Org"})
+    organisation_id = response.json()["id"]
+    items = [
+        {"location_name": f"Location {index}", "longitude": 0.0, "latitude": 0.0, "organisation_id": organisation_id}
+        for index in range(100)
+    ]
+    test_client.post("/api/organisations/create/locations/bulk", json={"items": items})
 
-    response = test_client.get("/api/organisations/create/location")
+    response = test_client.get(f"/api/organisations/{organisation_id}/locations", headers={"Accept-Encoding": "gzip"})
     assert response.status_code == status.HTTP_200_OK
-    assert "Location created" in response.json()["message"]
-    assert response.json()["location"]["location_name"] == "Default Name"
-    assert response.json()["location"]["longitude"] == 0.0
-    assert response.json()["location"]["latitude"] == 0.0
\ No newline at end of file
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()) == len(items)